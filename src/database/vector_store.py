@@ -9,6 +9,7 @@ Implements the three structured indexing dimensions:
 """
 from typing import List, Optional, Dict, Any
 import lancedb
+import numpy as np
 import pyarrow as pa
 import json
 from models.memory_entry import MemoryEntry
@@ -68,7 +69,13 @@ class VectorStore:
             pa.field("relations", pa.string()),  # Stored as JSON string for flexibility
             pa.field("raptor_level", pa.int32()),
             pa.field("parent_ids", pa.list_(pa.string())),
-            pa.field("vector", pa.list_(pa.float32(), self.embedding_model.dimension))
+            # Raw image bytes (e.g. page PNGs) stored inline; Lance handles
+            # large blobs natively, so retrieval is a single point-lookup
+            # instead of a DB read followed by a filesystem open
+            pa.field("image_blob", pa.large_binary()),
+            # float16 storage halves scan bandwidth for the vector column;
+            # distance kernels widen to f32 on the fly
+            pa.field("vector", pa.list_(pa.float16(), self.embedding_model.dimension))
         ])
 
         if self.table_name not in self.db.table_names():
@@ -105,6 +112,39 @@ class VectorStore:
         except Exception as e:
             print(f"FTS index creation skipped: {e}")
 
+    def drop_index(self):
+        """Drop the vector ANN index (call before a bulk ingest so inserts
+        skip per-row graph updates)."""
+        try:
+            self.table.drop_index("vector_idx")
+            print("Vector index dropped")
+        except Exception as e:
+            print(f"Vector index drop skipped: {e}")
+
+    def create_index(
+        self,
+        metric: str = "cosine",
+        num_partitions: int = 256,
+        num_sub_vectors: int = None
+    ):
+        """Build the IVF-PQ vector index in one shot (call after bulk ingest).
+
+        num_sub_vectors must evenly divide the vector dimension, so the
+        default derives it from the model (1024 -> 64). Failures propagate:
+        the bulk-ingest path drops the index first, and silently ending up
+        without one would leave every search on a brute-force scan.
+        """
+        if num_sub_vectors is None:
+            num_sub_vectors = max(8, self.embedding_model.dimension // 16)
+        self.table.create_index(
+            metric=metric,
+            num_partitions=num_partitions,
+            num_sub_vectors=num_sub_vectors,
+            vector_column_name="vector",
+            replace=True
+        )
+        print("Vector index created")
+
     def _results_to_entries(self, results: List[dict]) -> List[MemoryEntry]:
         """Convert LanceDB results to MemoryEntry objects."""
         entries = []
@@ -152,6 +192,7 @@ class VectorStore:
                 "relations": json.dumps(entry.relations, ensure_ascii=False),
                 "raptor_level": entry.raptor_level,
                 "parent_ids": entry.parent_ids,
+                "image_blob": None,  # Text-only entries carry no image payload
                 "vector": vector.tolist()
             })
 
@@ -162,6 +203,53 @@ class VectorStore:
         if not self._fts_initialized:
             self._init_fts_index()
 
+    def add_entries_bulk(self, entries: List[MemoryEntry], embed_batch_size: int = 256):
+        """
+        Bulk variant of add_entries for full-corpus ingests.
+
+        Embedding runs in explicit embed_batch_size chunks (amortizing model
+        call overhead without exceeding the encoder's comfortable batch), and
+        the rows land in LanceDB as one Arrow RecordBatch — a single fragment
+        instead of per-dict conversion and many small commits.
+        """
+        if not entries:
+            return
+
+        restatements = [entry.lossless_restatement for entry in entries]
+        vectors = np.vstack([
+            self.embedding_model.encode_documents(restatements[i:i + embed_batch_size])
+            for i in range(0, len(restatements), embed_batch_size)
+        ]).astype(np.float16)
+
+        schema = self.table.schema
+        columns = {
+            "entry_id": pa.array([e.entry_id for e in entries], pa.string()),
+            "lossless_restatement": pa.array(restatements, pa.string()),
+            "keywords": pa.array([e.keywords for e in entries], pa.list_(pa.string())),
+            "timestamp": pa.array([e.timestamp or "" for e in entries], pa.string()),
+            "location": pa.array([e.location or "" for e in entries], pa.string()),
+            "persons": pa.array([e.persons for e in entries], pa.list_(pa.string())),
+            "entities": pa.array([e.entities for e in entries], pa.list_(pa.string())),
+            "topic": pa.array([e.topic or "" for e in entries], pa.string()),
+            "section": pa.array([e.section or "" for e in entries], pa.string()),
+            "relations": pa.array(
+                [json.dumps(e.relations, ensure_ascii=False) for e in entries], pa.string()
+            ),
+            "raptor_level": pa.array([e.raptor_level for e in entries], pa.int32()),
+            "parent_ids": pa.array([e.parent_ids for e in entries], pa.list_(pa.string())),
+            "image_blob": pa.array([None] * len(entries), pa.large_binary()),
+            "vector": pa.FixedSizeListArray.from_arrays(
+                pa.array(vectors.reshape(-1)), self.embedding_model.dimension
+            ),
+        }
+        batch = pa.record_batch([columns[f.name] for f in schema], schema=schema)
+
+        self.table.add(batch)
+        print(f"Added {len(entries)} memory entries (bulk)")
+
+        if not self._fts_initialized:
+            self._init_fts_index()
+
     def semantic_search(self, query: str, top_k: int = 5) -> List[MemoryEntry]:
         """
         Semantic Layer Search - Dense vector similarity.
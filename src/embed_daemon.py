@@ -0,0 +1,94 @@
+"""
+Embedding Daemon
+Keeps one EmbeddingModel resident and serves encode requests over a Unix
+domain socket, so each MCP server restart skips the multi-second model load
+and sessions share a single copy of the weights.
+
+Protocol (all integers little-endian uint32):
+  request:  <len><orjson {"queries": [...], "is_query": bool}>
+  response: <rows><dim><rows*dim float32>
+An empty queries list acts as a handshake that just reports the dimension.
+"""
+
+import os
+import socket
+import struct
+import sys
+import threading
+from pathlib import Path
+
+# Setup paths
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+import orjson
+
+from utils.embedding import EmbeddingModel
+
+SOCKET_PATH = os.environ.get("EMBED_DAEMON_SOCKET", "/tmp/simplemem_embed.sock")
+
+
+def _recv_exact(conn: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = conn.recv(size)
+        if not chunk:
+            raise ConnectionError("client closed mid-frame")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _serve_client(conn: socket.socket, model: EmbeddingModel):
+    try:
+        while True:
+            header = conn.recv(4)
+            if not header:
+                break
+            if len(header) < 4:
+                header += _recv_exact(conn, 4 - len(header))
+            (length,) = struct.unpack("<I", header)
+
+            request = orjson.loads(_recv_exact(conn, length))
+            queries = request.get("queries") or []
+
+            if queries:
+                vectors = model.encode(queries, is_query=request.get("is_query", False))
+                arr = np.ascontiguousarray(vectors, dtype=np.float32)
+            else:
+                # Dimension handshake
+                arr = np.empty((0, model.dimension), dtype=np.float32)
+
+            conn.sendall(struct.pack("<II", arr.shape[0], arr.shape[1]) + arr.tobytes())
+    except (ConnectionError, OSError) as e:
+        print(f"[Daemon] Client dropped: {e}", file=sys.stderr)
+    finally:
+        conn.close()
+
+
+def main():
+    # Load once; every MCP session from here on connects in milliseconds
+    model = EmbeddingModel()
+
+    if os.path.exists(SOCKET_PATH):
+        os.unlink(SOCKET_PATH)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(SOCKET_PATH)
+    server.listen()
+    print(f"[Daemon] Embedding daemon listening on {SOCKET_PATH}", file=sys.stderr)
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=_serve_client, args=(conn, model), daemon=True).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(SOCKET_PATH):
+            os.unlink(SOCKET_PATH)
+
+
+if __name__ == "__main__":
+    main()
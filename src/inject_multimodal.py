@@ -7,6 +7,7 @@ import sys
 import os
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List
 
@@ -15,6 +16,7 @@ sys.path.insert(0, str(Path(__file__).parent))
 # sys.path.insert(0, str(Path(__file__).parent.parent / "simplified_mem")) # REMOVED
 
 import lancedb
+import numpy as np
 import pyarrow as pa
 from database.vector_store import VectorStore
 from models.memory_entry import MemoryEntry
@@ -41,6 +43,21 @@ class QwenViewEmbeddingWrapper:
 
         return self.base_model.encode_single(combined_input)
 
+    def embed_multimodal_batch(self, texts: List[str], image_paths: List[str]):
+        """
+        Batched variant of embed_multimodal.
+
+        Builds all combined text+visual inputs up front and encodes them in a
+        single model call, amortizing tokenizer and kernel-launch overhead
+        across the whole document instead of paying it once per page.
+        Returns an (N, D) ndarray, one row per input.
+        """
+        combined_inputs = [
+            text + f" [VISUAL_CONTENT: Image {Path(image_path).name}]"
+            for text, image_path in zip(texts, image_paths)
+        ]
+        return self.base_model.encode_documents(combined_inputs)
+
 def inject_multimodal_data(manifest_path: str, clear_db: bool = False):
     manifest_path = Path(manifest_path)
     if not manifest_path.exists():
@@ -81,34 +98,39 @@ def inject_multimodal_data(manifest_path: str, clear_db: bool = False):
     embedder = EmbeddingModel()
     vl_embedder = QwenViewEmbeddingWrapper(embedder)
 
-    entries = []
-    print(f"\n[Inject] Processing {len(manifest['pages'])} pages from {manifest['doc_name']}...")
+    pages = manifest['pages']
+    image_paths = [page['image_path'] for page in pages]
+    print(f"\n[Inject] Processing {len(pages)} pages from {manifest['doc_name']}...")
 
-    for page in manifest['pages']:
-        page_num = page['page_num']
-        image_path = page['image_path']
-
-        # Load raw text
-        with open(page['text_path'], 'r', encoding='utf-8') as f:
-            raw_text = f.read()
-
-        # Create Embedding
-        # This is where the magic happens: Text + Image -> Vector
-        vector = vl_embedder.embed_multimodal(raw_text, image_path) # Returns list float
+    # Load all per-page payloads in parallel (I/O-bound, GIL-free) so disk
+    # latency overlaps across pages instead of stacking linearly
+    with ThreadPoolExecutor(max_workers=16) as ex:
+        raw_texts = list(ex.map(
+            lambda page: Path(page['text_path']).read_text(encoding='utf-8'),
+            pages
+        ))
+        # Read each PNG once so the pixels live in the table itself
+        image_blobs = list(ex.map(lambda p: Path(p).read_bytes(), image_paths))
 
+    entries = []
+    for page, raw_text, image_path in zip(pages, raw_texts, image_paths):
         # Create Entry
         # Note: We must construct a MemoryEntry object even if we bypass some fields
         entry = MemoryEntry(
             lossless_restatement=raw_text, # Text payload for keyword search
             location=image_path,           # Image Payload for Retrieval
             topic=manifest['doc_name'],
-            section=f"Page {page_num}",
+            section=f"Page {page['page_num']}",
             keywords=[], # Auto-generated?
             relations=[]
         )
 
         entries.append(entry)
 
+    # Create Embeddings (one batched call for the whole document)
+    # This is where the magic happens: Text + Image -> Vector
+    vectors = vl_embedder.embed_multimodal_batch(raw_texts, image_paths)
+
     # 3. Batch Insert
     # We need to hack VectorStore to accept our pre-computed vector if possible?
     # VectorStore.add_entries computes embedding internally using self.embedding_model.
@@ -117,35 +139,38 @@ def inject_multimodal_data(manifest_path: str, clear_db: bool = False):
     # SOLUTION: We will manually insert into the table to bypass the standard text-only embedding
     # But we need access to the table.
 
-    # Prepare data for direct insertion
-    data = []
-    for i, entry in enumerate(entries):
-        # We computed the 'multimodal' vector above manually
-        # But 'add_entries' will re-compute it from text.
-        # We need to override it.
-
-        # Recalculate vector here to be sure (since previous loop didn't store it in entry object)
-        vector = vl_embedder.embed_multimodal(entry.lossless_restatement, entry.location)
-
-        item = {
-            "entry_id": entry.entry_id,
-            "lossless_restatement": entry.lossless_restatement,
-            "keywords": entry.keywords,
-            "timestamp": "",
-            "location": entry.location,
-            "persons": [],
-            "entities": [],
-            "topic": entry.topic,
-            "section": entry.section,
-            "relations": "[]",
-            "raptor_level": 0,
-            "parent_ids": [],
-            "vector": vector # Pre-computed Multimodal Vector
-        }
-        data.append(item)
-
-    print(f"  Inserting {len(data)} multimodal entries...")
-    vector_store.table.add(data)
+    # Prepare data for direct insertion.
+    # Build a typed Arrow RecordBatch (columnar) instead of a list of per-row
+    # dicts, so LanceDB ingests the columns as-is rather than re-boxing every
+    # field row by row.
+    schema = vector_store.table.schema
+    num_entries = len(entries)
+    # Store as float16 to match the table schema (half the bytes per vector)
+    vectors = np.asarray(vectors, dtype=np.float32).astype(np.float16)
+    dim = vectors.shape[1]
+
+    columns = {
+        "entry_id": pa.array([e.entry_id for e in entries], pa.string()),
+        "lossless_restatement": pa.array([e.lossless_restatement for e in entries], pa.string()),
+        "keywords": pa.array([e.keywords for e in entries], pa.list_(pa.string())),
+        "timestamp": pa.array([""] * num_entries, pa.string()),
+        "location": pa.array([e.location for e in entries], pa.string()),
+        "persons": pa.array([[] for _ in range(num_entries)], pa.list_(pa.string())),
+        "entities": pa.array([[] for _ in range(num_entries)], pa.list_(pa.string())),
+        "topic": pa.array([e.topic for e in entries], pa.string()),
+        "section": pa.array([e.section for e in entries], pa.string()),
+        "relations": pa.array(["[]"] * num_entries, pa.string()),
+        "raptor_level": pa.array([0] * num_entries, pa.int32()),
+        "parent_ids": pa.array([[] for _ in range(num_entries)], pa.list_(pa.string())),
+        # Page pixels stored inline as blobs (paths stay in 'location' for compat)
+        "image_blob": pa.array(image_blobs, pa.large_binary()),
+        # Pre-computed Multimodal Vectors, flattened into a FixedSizeList column
+        "vector": pa.FixedSizeListArray.from_arrays(pa.array(vectors.reshape(-1)), dim),
+    }
+    batch = pa.record_batch([columns[f.name] for f in schema], schema=schema)
+
+    print(f"  Inserting {num_entries} multimodal entries...")
+    vector_store.table.add(batch)
 
     print("\n[Inject] Complete!")
 
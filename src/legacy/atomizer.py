@@ -3,6 +3,7 @@ Markdown Atomizer Module - 深度知识原子化
 Transform linear Markdown into atomic knowledge entries.
 """
 
+import asyncio
 import os
 import sys
 import json
@@ -13,7 +14,7 @@ from typing import List, Dict, Any
 # Ensure we can import from simplified_mem
 sys.path.insert(0, str(Path(__file__).parent.parent / "simplified_mem"))
 
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 try:
     from config import OPENAI_API_KEY, OPENAI_BASE_URL, LLM_MODEL
@@ -23,21 +24,49 @@ except ImportError:
     OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", None)
     LLM_MODEL = "gpt-4"
 
+# Precompiled chunking patterns: code-fence markers and blank-line boundaries
+FENCE_RE = re.compile(r"(?m)^[ \t]*```")
+BLANK_RE = re.compile(r"\n(?:[ \t]*\n)+")
+
+# Token counting for bin-packing; fall back to the ~4 chars/token heuristic
+try:
+    import tiktoken
+    _token_encoder = tiktoken.get_encoding("cl100k_base")
+
+    def _token_len(text: str) -> int:
+        return len(_token_encoder.encode(text))
+except ImportError:
+    def _token_len(text: str) -> int:
+        return len(text) // 4
+
 class MarkdownAtomizer:
     """
     Core engine for Phase 4: deep atomization of Markdown content.
     """
 
+    # Cap on in-flight API calls (respect provider rate limits)
+    MAX_CONCURRENT_REQUESTS = 16
+
+    # Token budget per packed coreference prompt (many chunks are tiny, so
+    # packing cuts the number of round-trips by the packing ratio)
+    PACK_TOKEN_BUDGET = 3500
+
     def __init__(self, api_key: str = None, base_url: str = None, model: str = None):
         self.api_key = api_key or OPENAI_API_KEY
         self.base_url = base_url or OPENAI_BASE_URL
         self.model = model or LLM_MODEL
 
-        # Initialize OpenAI client
+        # Initialize async OpenAI client (LLM calls are fanned out concurrently)
         client_kwargs = {"api_key": self.api_key}
         if self.base_url:
             client_kwargs["base_url"] = self.base_url
-        self.client = OpenAI(**client_kwargs)
+        self.client = AsyncOpenAI(**client_kwargs)
+
+        # One event loop for the lifetime of the atomizer. The client's
+        # connection pool is bound to the loop it first ran on; asyncio.run
+        # per section would tear that loop down and every later section
+        # would hit "Event loop is closed" on the pooled connections.
+        self._loop = asyncio.new_event_loop()
 
     def atomize_section(self, markdown_text: str, section_id: str = "") -> Dict[str, Any]:
         """
@@ -46,21 +75,52 @@ class MarkdownAtomizer:
         1. Semantic Chunking
         2. Coreference Resolution per chunk
         3. Relation Extraction per chunk
+
+        The per-chunk LLM calls are pure I/O wait, so they run concurrently
+        via asyncio.gather instead of one blocking round-trip at a time.
         """
-        chunks = self._semantic_chunking(markdown_text)
+        return self._loop.run_until_complete(self._atomize_section_async(markdown_text, section_id))
 
-        atomized_results = []
-        all_relations = []
+    async def _atomize_section_async(self, markdown_text: str, section_id: str = "") -> Dict[str, Any]:
+        chunks = self._semantic_chunking(markdown_text)
 
         print(f"[Atomizer] Processing {len(chunks)} chunks for section {section_id}...")
 
-        for idx, chunk in enumerate(chunks):
-            # 1. Coreference Resolution
-            resolved_text = self._resolve_coreference(chunk, section_id)
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+
+        async def limited(coro):
+            async with semaphore:
+                return await coro
+
+        # 1. Coreference Resolution
+        # First-Fit-Decreasing pack small chunks into shared prompts, then
+        # fan the packed requests out concurrently
+        bins = self._pack_chunks(chunks)
+        bin_results = await asyncio.gather(
+            *[
+                limited(self._resolve_coreference_batch(
+                    [chunks[i] for i in bin_indices], section_id
+                ))
+                for bin_indices in bins
+            ]
+        )
+
+        resolved_texts: List[str] = [""] * len(chunks)
+        for bin_indices, texts in zip(bins, bin_results):
+            for i, text in zip(bin_indices, texts):
+                resolved_texts[i] = text
 
-            # 2. Relation Extraction
-            relations = self._extract_relations(resolved_text)
+        # 2. Relation Extraction (fan out over the resolved texts)
+        relations_per_chunk = await asyncio.gather(
+            *[limited(self._extract_relations(text)) for text in resolved_texts]
+        )
 
+        atomized_results = []
+        all_relations = []
+
+        for idx, (chunk, resolved_text, relations) in enumerate(
+            zip(chunks, resolved_texts, relations_per_chunk)
+        ):
             atomized_entry = {
                 "chunk_id": f"{section_id}_{idx}",
                 "original_text": chunk,
@@ -81,31 +141,98 @@ class MarkdownAtomizer:
         Split text into logical chunks.
         Strategy: Split by double newlines, but keep code blocks and figures intact.
         """
-        # Simple splitting by double newline for now, but sensitive to code fences
+        # Single regex pass instead of a per-line Python loop:
+        # 1. Locate code fences and pair them up into "inside a block" intervals
+        # 2. Split on blank-line runs, skipping any boundary inside a fence
+        fence_positions = [m.start() for m in FENCE_RE.finditer(text)]
+        fence_intervals = list(zip(fence_positions[0::2], fence_positions[1::2]))
+        if len(fence_positions) % 2:
+            # Unterminated fence: treat everything after it as in-block
+            fence_intervals.append((fence_positions[-1], len(text)))
+
         chunks = []
-        current_chunk = []
-        in_code_block = False
+        prev = 0
+        interval_idx = 0
+        for match in BLANK_RE.finditer(text):
+            boundary = match.start()
+            # Fence intervals and boundaries are both in document order
+            while interval_idx < len(fence_intervals) and fence_intervals[interval_idx][1] <= boundary:
+                interval_idx += 1
+            if interval_idx < len(fence_intervals) and fence_intervals[interval_idx][0] <= boundary:
+                continue  # Blank line inside a code block: keep the chunk intact
+
+            chunk = text[prev:boundary].strip('\n')
+            if chunk.strip():
+                chunks.append(chunk)
+            prev = match.end()
 
-        lines = text.split('\n')
+        tail = text[prev:].strip('\n')
+        if tail.strip():
+            chunks.append(tail)
 
-        for line in lines:
-            if line.strip().startswith('```'):
-                in_code_block = not in_code_block
+        return chunks
+
+    def _pack_chunks(self, chunks: List[str]) -> List[List[int]]:
+        """
+        First-Fit-Decreasing bin packing over approximate token counts.
+        Returns bins of chunk indices; each bin fits within PACK_TOKEN_BUDGET
+        (oversized chunks get a bin of their own). Indices inside a bin stay
+        in document order so the packed prompt reads naturally.
+        """
+        sizes = [_token_len(chunk) for chunk in chunks]
+        order = sorted(range(len(chunks)), key=lambda i: sizes[i], reverse=True)
 
-            # If we hit an empty line and we are NOT in a code block, split
-            if not line.strip() and not in_code_block:
-                if current_chunk:
-                    chunks.append('\n'.join(current_chunk))
-                    current_chunk = []
+        bins: List[List[int]] = []
+        bin_loads: List[int] = []
+        for i in order:
+            for b, load in enumerate(bin_loads):
+                if load + sizes[i] <= self.PACK_TOKEN_BUDGET:
+                    bins[b].append(i)
+                    bin_loads[b] += sizes[i]
+                    break
             else:
-                current_chunk.append(line)
+                bins.append([i])
+                bin_loads.append(sizes[i])
 
-        if current_chunk:
-            chunks.append('\n'.join(current_chunk))
+        for bin_indices in bins:
+            bin_indices.sort()
+        return bins
 
-        return chunks
+    async def _resolve_coreference_batch(self, chunks: List[str], context_hint: str) -> List[str]:
+        """
+        Resolve several chunks in one prompt; the LLM returns a JSON object
+        mapping chunk index to resolved text. Falls back to the originals on
+        parse/API failure, and to the single-chunk path for singleton bins.
+        """
+        if len(chunks) == 1:
+            return [await self._resolve_coreference(chunks[0], context_hint)]
+
+        system_prompt = """You are a technical editor. Your task is to perform "Coreference Resolution" on several independent text chunks at once.
+For each chunk, replace pronouns (it, they, this command, etc.) with their specific entity names based on context.
+Make each chunk self-contained and atomic. DO NOT change the meaning or technical details.
+If a chunk is already clear, return it as is.
+Return ONLY a JSON object mapping each chunk index (as a string) to its resolved text, e.g. {"0": "...", "1": "..."}.
+"""
+        numbered = "\n\n".join(f"[CHUNK {i}]\n{chunk}" for i, chunk in enumerate(chunks))
+        user_prompt = f"Context: Section {context_hint}\nChunks to resolve:\n---\n{numbered}\n---"
 
-    def _resolve_coreference(self, chunk: str, context_hint: str) -> str:
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.1,
+                response_format={"type": "json_object"}
+            )
+            data = json.loads(response.choices[0].message.content.strip())
+            return [str(data.get(str(i)) or chunks[i]) for i in range(len(chunks))]
+        except Exception as e:
+            print(f"[ERROR] Batched coreference resolution failed: {e}")
+            return list(chunks)
+
+    async def _resolve_coreference(self, chunk: str, context_hint: str) -> str:
         """
         Use LLM to resolve pronouns to specific entities.
         """
@@ -117,7 +244,7 @@ If the text is already clear, return it as is.
         user_prompt = f"Context: Section {context_hint}\nText to resolve:\n---\n{chunk}\n---\n\nResolved Text:"
 
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -130,7 +257,7 @@ If the text is already clear, return it as is.
             print(f"[ERROR] Coreference resolution failed: {e}")
             return chunk
 
-    def _extract_relations(self, text: str) -> List[Dict[str, str]]:
+    async def _extract_relations(self, text: str) -> List[Dict[str, str]]:
         """
         Extract engineering relations as triplets.
         """
@@ -143,7 +270,7 @@ Input: "The build.bat script requires a Windows environment."
 Output: [{"subject": "build.bat", "relation": "REQUIRES", "object": "Windows environment"}]
 """
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -168,10 +295,13 @@ Output: [{"subject": "build.bat", "relation": "REQUIRES", "object": "Windows env
 
 if __name__ == "__main__":
     # Simple test
-    atomizer = MarkdownAtomizer()
-    chunk = "It is used to compile the firmware. Build.bat must be run on Windows."
-    print("Original:", chunk)
-    res = atomizer._resolve_coreference(chunk, "2.2.2 Compilation")
-    print("Resolved:", res)
-    rels = atomizer._extract_relations(res)
-    print("Relations:", rels)
+    async def _test():
+        atomizer = MarkdownAtomizer()
+        chunk = "It is used to compile the firmware. Build.bat must be run on Windows."
+        print("Original:", chunk)
+        res = await atomizer._resolve_coreference(chunk, "2.2.2 Compilation")
+        print("Resolved:", res)
+        rels = await atomizer._extract_relations(res)
+        print("Relations:", rels)
+
+    asyncio.run(_test())
@@ -13,6 +13,8 @@ Markdown Generator Module - 文档生成器
 
 import os
 import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
@@ -35,6 +37,9 @@ class MarkdownWriter:
     2. 智能模式: 调用 Vision LLM 翻译图片
     """
 
+    # Vision 上下文的字符预算 (超出部分从最旧的内容开始丢弃)
+    CONTEXT_CHAR_BUDGET = 4096
+
     def __init__(
         self,
         output_dir: str = "knowledge_base",
@@ -49,6 +54,9 @@ class MarkdownWriter:
             ImageTranslator() if enable_vision else None
         )
 
+        # 后台写盘线程池: 原始图片落盘与下一次 Vision 调用重叠
+        self._io_pool = ThreadPoolExecutor(max_workers=4)
+
     def write_section(
         self,
         section_id: str,
@@ -71,56 +79,70 @@ class MarkdownWriter:
         if save_images:
             images_dir.mkdir(parents=True, exist_ok=True)
 
-        # 构建 Markdown 内容
-        md_lines = []
-        preceding_context = ""  # 累积的上下文 (用于 Vision)
-        section_title = ""
-        image_counter = 0
-
-        for element in elements:
-            if element.element_type == ElementType.HEADER:
-                # 章节标题
-                section_title = element.content
-                md_lines.append(f"# {element.content}\n\n")
-                preceding_context = element.content + "\n"
-
-            elif element.element_type == ElementType.TEXT:
-                # 文本块
-                text = element.content.strip()
-                if text:
-                    md_lines.append(text + "\n\n")
-                    preceding_context += text + "\n"
-
-            elif element.element_type == ElementType.IMAGE:
-                image_counter += 1
-
-                if self.enable_vision and self.translator and element.image_bytes:
-                    # 智能模式: 调用 Vision LLM
-                    print(f"  [VISION] 翻译图片 {image_counter}...")
-                    translated = self.translator.translate(
-                        element.image_bytes,
-                        preceding_context,
-                        section_title
-                    )
-                    md_lines.append(translated + "\n\n")
-                    preceding_context += translated + "\n"
-                else:
-                    # 纯文本模式: 占位符
-                    placeholder = f"[图片 {image_counter}: 待描述]\n\n"
-                    md_lines.append(placeholder)
-
-                # 保存原始图片
-                if save_images and element.image_bytes:
-                    img_path = images_dir / f"image_{image_counter}.png"
-                    with open(img_path, "wb") as f:
-                        f.write(element.image_bytes)
-
-        # 写入 Markdown 文件
         safe_id = section_id.replace(".", "_")
         md_path = self.output_dir / f"Section_{safe_id}.md"
 
-        with open(md_path, "w", encoding="utf-8") as f:
-            f.write("".join(md_lines))
+        # 累积的上下文 (用于 Vision): deque + 字符预算滑动窗口,
+        # 避免 += 拼接导致的 O(N^2) 复制, 同时限定内存上限
+        context_parts: deque = deque()
+        context_len = 0
+
+        def push_context(s: str):
+            nonlocal context_len
+            context_parts.append(s)
+            context_len += len(s)
+            while context_len > self.CONTEXT_CHAR_BUDGET and len(context_parts) > 1:
+                context_len -= len(context_parts.popleft())
+
+        section_title = ""
+        image_counter = 0
+        pending_writes = []
+
+        # 流式写入 Markdown: 逐元素写入缓冲文件, 不再累积 list + join
+        with open(md_path, "w", encoding="utf-8") as md_file:
+            for element in elements:
+                if element.element_type == ElementType.HEADER:
+                    # 章节标题
+                    section_title = element.content
+                    md_file.write(f"# {element.content}\n\n")
+                    context_parts.clear()
+                    context_len = 0
+                    push_context(element.content + "\n")
+
+                elif element.element_type == ElementType.TEXT:
+                    # 文本块
+                    text = element.content.strip()
+                    if text:
+                        md_file.write(text + "\n\n")
+                        push_context(text + "\n")
+
+                elif element.element_type == ElementType.IMAGE:
+                    image_counter += 1
+
+                    if self.enable_vision and self.translator and element.image_bytes:
+                        # 智能模式: 调用 Vision LLM (上下文仅在此处拼成字符串)
+                        print(f"  [VISION] 翻译图片 {image_counter}...")
+                        translated = self.translator.translate(
+                            element.image_bytes,
+                            "".join(context_parts),
+                            section_title
+                        )
+                        md_file.write(translated + "\n\n")
+                        push_context(translated + "\n")
+                    else:
+                        # 纯文本模式: 占位符
+                        md_file.write(f"[图片 {image_counter}: 待描述]\n\n")
+
+                    # 保存原始图片 (后台线程写盘, 不阻塞下一次 Vision 调用)
+                    if save_images and element.image_bytes:
+                        img_path = images_dir / f"image_{image_counter}.png"
+                        pending_writes.append(
+                            self._io_pool.submit(Path(img_path).write_bytes, element.image_bytes)
+                        )
+
+        # 返回前等待本章节的图片写盘完成 (线程池保留, 供后续章节复用)
+        for future in pending_writes:
+            future.result()
 
         print(f"  [DONE] 已生成: {md_path}")
         return md_path
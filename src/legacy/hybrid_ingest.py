@@ -9,6 +9,8 @@ Hybrid Page-Level Ingestor - 混合式页面摄取器
    - 要求 LLM 重建 Markdown，优先信任图片中的图表布局，使用文本校准文字识别
 """
 
+import asyncio
+import bisect
 import sys
 import os
 import re
@@ -24,7 +26,45 @@ sys.path.insert(0, str(Path(__file__).parent.parent / "simplified_mem"))
 from vision_agent import ImageTranslator
 from stream_builder_legacy import TOCEntry  # Reuse TOC structure but not logic
 
+# 模块加载时一次性编译 (避免逐页/逐章节重复编译)
+_VISION_TRIGGER = re.compile(r"(?:Figure|Fig\.|Table)\s+\d+")
+_REVISION_RE = re.compile(r"Revision_\d+\.\d+_.*")
+# 匹配整行噪音 (页眉/页脚), 连同换行一起删除
+_NOISE_LINE_RE = re.compile(
+    r"(?m)^.*(?:Modifications reserved|Document number|Bosch Sensortec).*\n?"
+)
+# 从标题中提取章节 ID (例如 "2.2.2 Compiling..." -> "2.2.2")
+_TOC_ID_RE = re.compile(r"^([\d.]+)")
+
+# orjson 解析深层嵌套 TOC 比 stdlib 快 3-5x, 不可用时回退
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    import json
+    _loads = json.loads
+
+class PageMap:
+    """
+    页码 -> 章节 ID 的映射。
+
+    基于 bisect 的 O(log n) 查找, 替代预先铺满 1..max_page 的 dict。
+    """
+
+    def __init__(self, page_starts: List[int], section_ids: List[str]):
+        self._page_starts = page_starts  # 各章节起始页 (升序)
+        self._section_ids = section_ids
+
+    def __getitem__(self, page_num: int) -> str:
+        i = bisect.bisect_right(self._page_starts, page_num) - 1
+        return self._section_ids[i] if i >= 0 else "_preamble"
+
+
 class HybridPageIngestor:
+
+    # 并发的 Vision API 调用数 (网络等待期间继续光栅化后续页面)
+    VISION_WORKERS = 8
+
     def __init__(self, pdf_path: str, output_dir: str):
         self.doc = fitz.open(pdf_path)
         self.output_dir = Path(output_dir)
@@ -38,53 +78,19 @@ class HybridPageIngestor:
     def process_document(self, toc_json_path: str, target_page: int = None, target_section: str = None) -> List[str]:
         """
         处理文档: 遍历所有页面，根据策略生成 Markdown
+
+        页面光栅化 (CPU) 与 Vision API 调用 (网络) 通过 asyncio 流水线重叠:
+        生产者在线程池中逐页提取文本/截图，消费者并发等待 Vision 响应。
         """
         # Load TOC to know section boundaries (conceptually)
         # In this simplified page-level approach, we generate files per SECTION ID
         # So we need to map Pages -> Sections
         page_to_section = self._map_pages_to_sections(toc_json_path)
 
-        # Buffer to hold markdown content for each section
-        section_buffers: Dict[str, List[str]] = {}
-
-        total_pages = len(self.doc)
-        print(f"[Ingestor] Processing {total_pages} pages...")
-
-        for page_idx in range(total_pages):
-            page_num = page_idx + 1
-
-            # Filtering
-            if target_page and page_num != target_page:
-                continue
-
-            # If target section provided, check if this page belongs to it
-            current_section_id = page_to_section.get(page_num, "Unknown")
-            if target_section and current_section_id != target_section:
-                continue
-
-            print(f"\n[Page {page_num}] Section: {current_section_id}")
-
-            # 1. Extract Raw Text (Candidate)
-            page = self.doc[page_idx]
-            raw_text = page.get_text("text")
-
-            # 2. Decision Logic
-            use_vision = self._should_trigger_vision(raw_text)
-
-            final_content = ""
-            if use_vision:
-                print(f"  [TRIGGER] Found Figure/Table -> Activating Vision Mode")
-                final_content = self._process_with_vision(page, raw_text, page_num)
-            else:
-                print(f"  [FAST] Text-only mode")
-                final_content = self._clean_text(raw_text)
-
-            # 3. Buffer Result
-            if current_section_id not in section_buffers:
-                section_buffers[current_section_id] = []
-
-            # Add page marker for debugging/structure
-            section_buffers[current_section_id].append(final_content)
+        # Buffer to hold markdown content for each section (pages in order)
+        section_buffers = asyncio.run(
+            self._process_pages_async(page_to_section, target_page, target_section)
+        )
 
         # 4. Write to Files
         generated_files = []
@@ -108,6 +114,91 @@ class HybridPageIngestor:
 
         return generated_files
 
+    async def _process_pages_async(
+        self,
+        page_to_section: PageMap,
+        target_page: int = None,
+        target_section: str = None
+    ) -> Dict[str, List[str]]:
+        """
+        生产者/消费者流水线:
+        - 生产者: 在线程池中提取文本 + 按需光栅化 (fitz 不是线程安全的,
+          所以逐页 await, 但与在途的 Vision 调用重叠)
+        - 消费者: VISION_WORKERS 个协程并发等待 Vision API
+        结果按 page_num 排序后再汇入 section_buffers, 保持阅读顺序。
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.VISION_WORKERS * 2)
+        results: Dict[int, Tuple[str, str]] = {}  # page_num -> (section_id, content)
+        loop = asyncio.get_running_loop()
+
+        total_pages = len(self.doc)
+        print(f"[Ingestor] Processing {total_pages} pages...")
+
+        def rasterize(page_idx: int) -> Tuple[str, Optional[str]]:
+            # 1. Extract Raw Text (Candidate)
+            page = self.doc[page_idx]
+            raw_text = page.get_text("text")
+
+            # 2. Decision Logic (only rasterize when vision is needed)
+            if not self._should_trigger_vision(raw_text):
+                return raw_text, None
+
+            # JPEG at 1.5x zoom: ~4x smaller payload than 2x PNG, so ~4x less
+            # base64 work and upload time (which dominates per-page latency)
+            pix = page.get_pixmap(matrix=fitz.Matrix(1.5, 1.5))
+            img_bytes = pix.tobytes("jpeg", jpg_quality=85)
+            return raw_text, "data:image/jpeg;base64," + base64.b64encode(img_bytes).decode("ascii")
+
+        async def producer():
+            for page_idx in range(total_pages):
+                page_num = page_idx + 1
+
+                # Filtering
+                if target_page and page_num != target_page:
+                    continue
+
+                # If target section provided, check if this page belongs to it
+                section_id = page_to_section[page_num]
+                if target_section and section_id != target_section:
+                    continue
+
+                raw_text, image_url = await loop.run_in_executor(None, rasterize, page_idx)
+                await queue.put((page_num, section_id, raw_text, image_url))
+
+                # 定期收缩 fitz 渲染缓存, 避免大文档 RSS 随页数线性增长
+                if page_num % 16 == 0:
+                    fitz.TOOLS.store_shrink(100)
+
+            for _ in range(self.VISION_WORKERS):
+                await queue.put(None)  # 结束信号
+
+        async def consumer():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                page_num, section_id, raw_text, image_url = item
+
+                if image_url is None:
+                    print(f"[Page {page_num}] Section: {section_id} [FAST] Text-only mode")
+                    results[page_num] = (section_id, self._clean_text(raw_text))
+                else:
+                    print(f"[Page {page_num}] Section: {section_id} [TRIGGER] Found Figure/Table -> Activating Vision Mode")
+                    content = await self._process_with_vision(image_url, raw_text, page_num)
+                    results[page_num] = (section_id, content)
+
+        await asyncio.gather(producer(), *[consumer() for _ in range(self.VISION_WORKERS)])
+
+        # 3. Buffer Result (page order restored before joining per-section)
+        section_buffers: Dict[str, List[str]] = {}
+        for page_num in sorted(results):
+            section_id, content = results[page_num]
+            if section_id not in section_buffers:
+                section_buffers[section_id] = []
+            section_buffers[section_id].append(content)
+
+        return section_buffers
+
     def _should_trigger_vision(self, text: str) -> bool:
         """
         Trigger if 'Figure X' or 'Table X' is detected.
@@ -116,8 +207,7 @@ class HybridPageIngestor:
         """
         # Look for "Figure <digit>" or "Table <digit>"
         # Also include "Fig." just in case
-        pattern = r"(Figure|Fig\.|Table)\s+\d+"
-        return bool(re.search(pattern, text))
+        return bool(_VISION_TRIGGER.search(text))
 
     def _clean_text(self, text: str) -> str:
         """
@@ -126,28 +216,16 @@ class HybridPageIngestor:
         We'll just rely on the fact that raw text usually extracts in order.
         TODO: Improve heater/footer filtering if strictly needed, but Vision mode handles the critical parts.
         """
-        # Simple noise filter
-        lines = text.split('\n')
-        # Filter obvious noise lines
-        clean_lines = [
-            line for line in lines
-            if "Modifications reserved" not in line
-            and "Document number" not in line
-            and "Bosch Sensortec" not in line
-        ]
-        return "\n".join(clean_lines)
-
-    def _process_with_vision(self, page: fitz.Page, raw_text: str, page_num: int) -> str:
+        # Simple noise filter: one C-level regex pass over the whole buffer
+        # instead of split('\n') + a per-line Python comparison chain
+        return _NOISE_LINE_RE.sub("", text)
+
+    async def _process_with_vision(self, image_url: str, raw_text: str, page_num: int) -> str:
         """
         Full Page Vision Analysis.
+        快照已由生产者在线程池中完成, 这里只负责构建 Prompt 并异步等待 API。
         """
-        # 1. Take Snapshot (High DPI)
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-        img_bytes = pix.tobytes("png")
-        image_b64 = base64.b64encode(img_bytes).decode("utf-8")
-        image_url = f"data:image/png;base64,{image_b64}"
-
-        # 2. Build Prompt
+        # 1. Build Prompt
         prompt = f"""
 I am converting a technical manual page to Markdown.
 This specific page contains complex Figures or Tables (Vector Graphics) that standard OCR misses.
@@ -165,9 +243,9 @@ This specific page contains complex Figures or Tables (Vector Graphics) that sta
 5. Do not output "Here is the markdown..." just output the content.
 """
 
-        # 3. Call Vision Agent (reusing client logic manually for custom prompt)
+        # 2. Call Vision Agent (reusing client logic manually for custom prompt)
         try:
-            response = self.vision_agent.client.chat.completions.create(
+            response = await self.vision_agent.async_client.chat.completions.create(
                 model=self.vision_agent.model,
                 messages=[
                     {"role": "system", "content": "You are a technical documentation expert."},
@@ -192,24 +270,23 @@ This specific page contains complex Figures or Tables (Vector Graphics) that sta
         """Global cleanup for TBDs etc"""
         text = text.replace("[TBD]", "")
         # Remove lines like "Revision_2.6..."
-        text = re.sub(r"Revision_\d+\.\d+_.*", "", text)
+        text = _REVISION_RE.sub("", text)
         return text
 
-    def _map_pages_to_sections(self, toc_path: str) -> Dict[int, str]:
+    def _map_pages_to_sections(self, toc_path: str) -> PageMap:
         """
-        Creates a map {PageNum: SectionID}.
+        Creates a PageMap (page_num -> SectionID).
         Logic: A page belongs to the latest Section ID encountered in TOC up to that page.
+        Lookup is bisect-based, so no per-page dict needs to be materialized.
         """
-        import json
-        with open(toc_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = _loads(Path(toc_path).read_bytes())
 
         # Flatten TOC
         entries = []
         def flatten(items):
             for item in items:
                 # Extract ID "2.2.2" from title "2.2.2 Compiling..."
-                match = re.match(r"^([\d.]+)", item["title"])
+                match = _TOC_ID_RE.match(item["title"])
                 sec_id = match.group(1) if match else "Unknown"
                 entries.append({"page": item["page"], "id": sec_id})
                 if item.get("children"):
@@ -218,31 +295,13 @@ This specific page contains complex Figures or Tables (Vector Graphics) that sta
         flatten(data.get("toc_tree", []))
         entries.sort(key=lambda x: x["page"])
 
-        # Fill map
-        # If Page 5 is Sec 2.1, and Page 8 is Sec 2.2
-        # Page 5,6,7 -> 2.1
-        page_map = {}
-        last_id = "_preamble"
-
-        # We need max page. Let's assume 100 or get from doc (not available here easily without doc open)
-        # We'll build up to last known TOC page + buffer
-        max_page = entries[-1]["page"] + 50
-
-        toc_idx = 0
-        for p in range(1, max_page + 1):
-            # Check if this page starts a new section
-            # Handle multiple sections on same page?
-            # Simplified: The LAST section starting on this page wins for the WHOLE page?
-            # Or better: The section active at start of page.
-            # Let's stick to: Page mapping follows the starts.
-
-            while toc_idx < len(entries) and entries[toc_idx]["page"] <= p:
-                last_id = entries[toc_idx]["id"]
-                toc_idx += 1
-
-            page_map[p] = last_id
+        # If Page 5 is Sec 2.1, and Page 8 is Sec 2.2 -> Page 5,6,7 map to 2.1.
+        # When multiple sections start on the same page, the last one wins,
+        # matching the old fill-forward behavior.
+        page_starts = [e["page"] for e in entries]
+        section_ids = [e["id"] for e in entries]
 
-        return page_map
+        return PageMap(page_starts, section_ids)
 
 if __name__ == "__main__":
     # Test script
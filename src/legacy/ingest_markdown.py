@@ -5,7 +5,7 @@ Orchestrates the process of reading Markdown files, atomizing them, and preparin
 
 import os
 import sys
-import json
+import orjson
 import concurrent.futures
 from pathlib import Path
 from typing import Dict, Any, List
@@ -15,30 +15,48 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 from atomizer import MarkdownAtomizer
 
+# Per-process pipeline, built once by the ProcessPoolExecutor initializer
+# (the atomizer holds an API client, which is not picklable)
+_worker_pipeline = None
+
+def _init_worker(output_dir: str):
+    global _worker_pipeline
+    _worker_pipeline = IngestionPipeline(output_dir=output_dir)
+
+def _process_file_worker(md_path: str, force: bool, output_exists: bool) -> str:
+    return _worker_pipeline.process_file(md_path, force, output_exists=output_exists)
+
 class IngestionPipeline:
     """
     Pipeline to ingest Markdown files into atomic knowledge entries.
     """
 
-    def __init__(self, output_dir: str = "atomized_data", max_workers: int = 10):
+    def __init__(self, output_dir: str = "atomized_data", max_workers: int = None):
         self.atomizer = MarkdownAtomizer()
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        self.max_workers = max_workers
+        # Default: one process per core, minus one for the parent
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
 
-    def process_file(self, md_path: str, force: bool = False) -> str:
+    def process_file(self, md_path: str, force: bool = False, output_exists: bool = None) -> str:
         """
         Process a single Markdown file.
         Returns the path to the saved JSON output.
+
+        output_exists: precomputed by process_directory from one directory
+        listing; when None (standalone call) the paths are stat'ed here.
         """
         md_file = Path(md_path)
-        if not md_file.exists():
-            raise FileNotFoundError(f"File not found: {md_path}")
-
-        # Check if already exists
         output_filename = f"atomized_{md_file.stem}.json"
         output_path = self.output_dir / output_filename
-        if output_path.exists() and not force:
+
+        if output_exists is None:
+            if not md_file.exists():
+                raise FileNotFoundError(f"File not found: {md_path}")
+            output_exists = output_path.exists()
+
+        # Check if already exists
+        if output_exists and not force:
             print(f"[Pipeline] Skipping {md_file.name} (already atomized)")
             return str(output_path)
 
@@ -57,15 +75,18 @@ class IngestionPipeline:
         # Add metadata
         result["source_file"] = str(md_file)
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
+        # orjson emits UTF-8 bytes directly; write binary to skip the decode
+        with open(output_path, "wb") as f:
+            f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
 
         print(f"[Pipeline] Saved atomized data to: {output_path}")
         return str(output_path)
 
     def process_directory(self, input_dir: str, force: bool = False) -> List[str]:
         """
-        Process all Markdown files in a directory using thread pool.
+        Process all Markdown files in a directory using a process pool.
+        Atomization is Python-CPU work (chunking, prompt/JSON build) that
+        holds the GIL, so one interpreter per core beats threads here.
         """
         input_path = Path(input_dir)
         if not input_path.exists() or not input_path.is_dir():
@@ -74,10 +95,34 @@ class IngestionPipeline:
         md_files = sorted(list(input_path.glob("Section_*.md")))
         print(f"[Pipeline] Found {len(md_files)} markdown files. Using {self.max_workers} workers.")
 
+        # One directory listing answers every output-existence check; the
+        # sources came from glob, so they exist by construction
+        existing_outputs = {p.name for p in self.output_dir.iterdir()}
+
+        # Short-circuit already-atomized files here rather than inside the
+        # workers: a force=False re-run never occupies a pool slot per skip
         output_paths = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Prepare futures
-            future_to_file = {executor.submit(self.process_file, str(md_file), force): md_file for md_file in md_files}
+        if not force:
+            skipped = [f for f in md_files if f"atomized_{f.stem}.json" in existing_outputs]
+            if skipped:
+                print(f"[Pipeline] Skipping {len(skipped)} already-atomized files.")
+                output_paths.extend(
+                    str(self.output_dir / f"atomized_{f.stem}.json") for f in skipped
+                )
+                md_files = [f for f in md_files if f"atomized_{f.stem}.json" not in existing_outputs]
+        if not md_files:
+            return output_paths
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_worker,
+            initargs=(str(self.output_dir),)
+        ) as executor:
+            # Prepare futures (module-level worker fn keeps the task picklable);
+            # everything submitted survived the skip filter above
+            future_to_file = {
+                executor.submit(_process_file_worker, str(md_file), force, False): md_file
+                for md_file in md_files
+            }
 
             for future in concurrent.futures.as_completed(future_to_file):
                 md_file = future_to_file[future]
@@ -95,7 +140,7 @@ if __name__ == "__main__":
     parser.add_argument("--file", "-f", type=str, help="Process a single file")
     parser.add_argument("--dir", "-d", type=str, help="Process all files in a directory")
     parser.add_argument("--force", action="store_true", help="Force re-atomization")
-    parser.add_argument("--workers", "-w", type=int, default=10, help="Number of parallel workers")
+    parser.add_argument("--workers", "-w", type=int, default=None, help="Number of parallel workers (default: cores - 1)")
     args = parser.parse_args()
 
     pipeline = IngestionPipeline(max_workers=args.workers)
@@ -10,14 +10,21 @@ Stream Builder Module - 流式构建器
 """
 
 import io
-import json
+import mmap
+import orjson
+import os
 import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
 from enum import Enum
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
 from typing import Optional
 
 import fitz  # PyMuPDF
+import numpy as np
 from PIL import Image
 from rapidocr_onnxruntime import RapidOCR
 
@@ -31,15 +38,42 @@ def get_ocr_engine():
     return _ocr_engine
 
 
+# 噪音模式 (页眉/页脚常见文本)
+NOISE_PATTERNS = [
+    "Modifications reserved",
+    "Data subject to change",
+    "Printed in Germany",
+    "Document number:",
+    "Revision_",
+    "| 61",  # 页码分隔符
+    "Bosch Sensortec |",
+    "[TBD]",
+    ". . . . . .", # TOC 引导符
+]
+
+# 单次编译的交替式: 一趟扫描即可命中任意噪音模式,
+# 替代每个文本块 N 次 `in` 子串扫描
+_NOISE_RE = re.compile("|".join(re.escape(p) for p in NOISE_PATTERNS))
+
+# 章节标题检测 (模块加载时编译一次)
+_SECTION_RE = re.compile(r"^(\d+(?:\.\d+)*)\s+\S")
+_TOC_DOT_RE = re.compile(r"\.\.+\s*\d+$")
+
+# 其余热路径正则同样提升到模块级, 绕过 re 内部缓存查找
+_FIGURE_RE = re.compile(r"^Figure\s+\d+:")
+_TITLE_ID_RE = re.compile(r"^([\d.]+)\s+")
+_TITLE_CORE_RE = re.compile(r"^[\d.]+\s+(.+)$")
+
+
 class ElementType(Enum):
     TEXT = "text"
     IMAGE = "image"
     HEADER = "header"  # 章节标题 (特殊文本块)
 
 
-@dataclass
+@dataclass(slots=True)
 class StreamElement:
-    """流中的单个元素"""
+    """流中的单个元素 (slots: 全文档会产生数万实例, 去掉逐实例 __dict__)"""
     element_type: ElementType
     content: str  # 文本内容或图片路径 (对于图片)
     page_num: int  # 原始页码 (1-indexed for human readability)
@@ -53,7 +87,7 @@ class StreamElement:
         return f"<{self.element_type.value}@P{self.page_num}:Y{self.y_position:.0f} '{preview}'>"
 
 
-@dataclass
+@dataclass(slots=True)
 class TOCEntry:
     """目录条目"""
     title: str
@@ -74,45 +108,76 @@ class PDFStreamLoader:
     MIN_IMAGE_WIDTH = 50
     MIN_IMAGE_HEIGHT = 50
 
+    # 截图缩放矩阵 (2x 保证清晰); 预分配一次, 每次截图复用
+    _SNAPSHOT_MATRIX = fitz.Matrix(2, 2)
+
     def __init__(self, pdf_path: str):
         self.pdf_path = Path(pdf_path)
         self.doc: Optional[fitz.Document] = None
         self.global_stream: list[StreamElement] = []
+        # 只读 mmap 整个 PDF: 主进程与 worker 进程经由同一批物理页
+        # (OS page cache) 读取文件, 避免每次 open 重新走磁盘
+        self._fd = os.open(str(self.pdf_path), os.O_RDONLY)
+        self._mm = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
 
     def load(self) -> list[StreamElement]:
-        """加载 PDF 并构建全局流"""
-        self.doc = fitz.open(self.pdf_path)
+        """加载 PDF 并构建全局流 (页面提取按进程并行)"""
+        # fitz 的 stream 参数不接受 mmap 对象, 需经 memoryview 暴露缓冲区
+        self.doc = fitz.open(stream=memoryview(self._mm), filetype="pdf")
+        total_pages = len(self.doc)
         all_elements = []
 
-        for page_idx in range(len(self.doc)):
-            page = self.doc[page_idx]
-            page_num = page_idx + 1  # 1-indexed
-
-            # 提取文本块
-            text_elements = self._extract_text_blocks(page, page_num)
-            all_elements.extend(text_elements)
-
-            # 提取图片块
-            image_elements = self._extract_images(page, page_num)
-            all_elements.extend(image_elements)
+        # 文本/图片提取是 PyMuPDF 的 CPU 密集工作, 且不完全释放 GIL;
+        # 每个 worker 进程打开自己的 Document (见 _extract_page_elements)
+        pdf_path = str(self.pdf_path)
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for text_elements, image_elements in executor.map(
+                _extract_page_elements,
+                repeat(pdf_path),
+                range(total_pages),
+                chunksize=4
+            ):
+                all_elements.extend(text_elements)
+                all_elements.extend(image_elements)
 
         # 按 (page_num, y_position) 排序形成线性流
-        self.global_stream = sorted(all_elements, key=lambda e: (e.page_num, e.y_position))
+        self.global_stream = self._sort_stream(all_elements)
 
         # [自动修复] 恢复丢失的矢量图 (针对 Figure X 但无图片的情况)
         self._recover_vector_figures()
 
         # 再次排序，确保插入的图片在正确位置
-        self.global_stream.sort(key=lambda e: (e.page_num, e.y_position))
+        self.global_stream = self._sort_stream(self.global_stream)
 
         return self.global_stream
 
+    @staticmethod
+    def _sort_stream(elements: list[StreamElement]) -> list[StreamElement]:
+        """
+        按 (page_num, y_position) 排序。
+
+        把排序键抽成 SoA numpy 数组后用 lexsort: C 层基数式排序,
+        避免 Timsort 每次比较都走一遍 Python lambda + 属性访问。
+        """
+        count = len(elements)
+        if count < 2:
+            return list(elements)
+
+        pages = np.fromiter((e.page_num for e in elements), dtype=np.int32, count=count)
+        ys = np.fromiter((e.y_position for e in elements), dtype=np.float32, count=count)
+        order = np.lexsort((ys, pages))  # 主键 pages, 次键 ys
+        return [elements[i] for i in order]
+
     def _recover_vector_figures(self):
         """
         扫描流中的 'Figure X:' 字样，如果上方没有图片，则尝试截图 (处理矢量绘图)。
+        同一页的多个孤儿 caption 共享一次整页渲染 (见 _take_page_snapshots)。
         """
+        # 第一遍: 收集孤儿 caption, 按页分组
+        orphans_by_page: dict[int, list[float]] = {}
+
         for i, elem in enumerate(self.global_stream):
-            if elem.element_type == ElementType.TEXT and re.match(r"^Figure\s+\d+:", elem.content):
+            if elem.element_type == ElementType.TEXT and _FIGURE_RE.match(elem.content):
                 # 检查上一个元素是否是图片
                 prev_elem = self.global_stream[i-1] if i > 0 else None
 
@@ -133,17 +198,27 @@ class PDFStreamLoader:
 
                 if needs_recovery:
                     print(f"[Auto-Recovery] Detected orphan caption '{elem.content[:20]}...' at P{elem.page_num}:Y{elem.y_position}. Attempting snapshot.")
-                    snapshot = self._take_page_snapshot(elem.page_num, elem.y_position)
-                    if snapshot:
-                        # 插入到 caption 之前
-                        self.global_stream.append(snapshot)
+                    orphans_by_page.setdefault(elem.page_num, []).append(elem.y_position)
+
+        # 第二遍: 每页只光栅化一次, 从共享像素裁剪出各截图
+        for page_num, caption_ys in orphans_by_page.items():
+            self.global_stream.extend(self._take_page_snapshots(page_num, caption_ys))
 
-    def _take_page_snapshot(self, page_num: int, caption_y: float) -> Optional[StreamElement]:
-        """对 caption 上方区域进行截图"""
+    def _take_page_snapshots(self, page_num: int, caption_ys: list[float]) -> list[StreamElement]:
+        """对同一页的多个 caption 上方区域截图: 整页渲染一次, PIL 裁剪"""
         try:
             page = self.doc[page_num - 1]
             rect = page.rect
+            pix = page.get_pixmap(matrix=self._SNAPSHOT_MATRIX)
+            img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        except Exception as e:
+            print(f"[WARN] Snapshot failed: {e}")
+            return []
+
+        zoom = self._SNAPSHOT_MATRIX.a
+        snapshots = []
 
+        for caption_y in caption_ys:
             # 定义截图区域: Caption 上方 300 像素范围 (不包括页眉)
             # 动态调整高度: min(caption_y - 50, 350)
             lookback_height = 350
@@ -153,66 +228,54 @@ class PDFStreamLoader:
 
             clip_rect = fitz.Rect(rect.x0 + 50, top_y, rect.x1 - 50, bottom_y) # 左右留边
 
-            # 渲染
-            pix = page.get_pixmap(clip=clip_rect, matrix=fitz.Matrix(2, 2)) # 2x 缩放保证清晰
-            img_bytes = pix.tobytes("png")
+            try:
+                crop = img.crop((
+                    int(clip_rect.x0 * zoom), int(clip_rect.y0 * zoom),
+                    int(clip_rect.x1 * zoom), int(clip_rect.y1 * zoom)
+                ))
+                buf = io.BytesIO()
+                crop.save(buf, format="PNG")
 
-            return StreamElement(
-                element_type=ElementType.IMAGE,
-                content=f"[SNAPSHOT:P{page_num}]",
-                page_num=page_num,
-                y_position=top_y,
-                bbox=(clip_rect.x0, clip_rect.y0, clip_rect.x1, clip_rect.y1),
-                image_bytes=img_bytes
-            )
-        except Exception as e:
-            print(f"[WARN] Snapshot failed: {e}")
-            return None
+                snapshots.append(StreamElement(
+                    element_type=ElementType.IMAGE,
+                    content=f"[SNAPSHOT:P{page_num}]",
+                    page_num=page_num,
+                    y_position=top_y,
+                    bbox=(clip_rect.x0, clip_rect.y0, clip_rect.x1, clip_rect.y1),
+                    image_bytes=buf.getvalue()
+                ))
+            except Exception as e:
+                print(f"[WARN] Snapshot failed: {e}")
+
+        return snapshots
 
     def _extract_text_blocks(self, page: fitz.Page, page_num: int) -> list[StreamElement]:
         """提取页面上的文本块 (过滤页眉页脚噪音)"""
         elements = []
-        blocks = page.get_text("dict", flags=fitz.TEXT_PRESERVE_WHITESPACE)["blocks"]
         page_height = page.rect.height
 
-        # 噪音模式 (页眉/页脚常见文本)
-        NOISE_PATTERNS = [
-            "Modifications reserved",
-            "Data subject to change",
-            "Printed in Germany",
-            "Document number:",
-            "Revision_",
-            "| 61",  # 页码分隔符
-            "Bosch Sensortec |",
-            "[TBD]",
-            ". . . . . .", # TOC 引导符
-        ]
-
-        for block in blocks:
-            if block.get("type") != 0:  # 0 = text block
+        # "blocks" 模式直接从 C 层返回 (x0,y0,x1,y1,text,no,type) 扁平元组,
+        # 跳过 "dict" 模式的 blocks/lines/spans 嵌套结构和 Python 级拼接
+        for x0, y0, x1, y1, text, _block_no, block_type in page.get_text(
+            "blocks", flags=fitz.TEXT_PRESERVE_WHITESPACE
+        ):
+            if block_type != 0:  # 0 = text block
                 continue
 
-            # 合并 block 中的所有行
-            text_lines = []
-            for line in block.get("lines", []):
-                line_text = "".join(span["text"] for span in line.get("spans", []))
-                text_lines.append(line_text)
-
-            text = "\n".join(text_lines).strip()
+            text = text.strip()
             if not text:
                 continue
 
-            bbox = block["bbox"]  # (x0, y0, x1, y1)
-            y_pos = bbox[1]  # y0
+            y_pos = y0
 
             # 过滤条件 1: 页眉 (Y < 50) 或页脚 (Y > page_height - 50)
             if y_pos < 50 or y_pos > page_height - 50:
                 # 额外检查是否包含噪音模式
-                if any(pattern in text for pattern in NOISE_PATTERNS):
+                if _NOISE_RE.search(text):
                     continue  # 跳过噪音
 
             # 过滤条件 2: 任何位置包含噪音模式的短文本块
-            if len(text) < 100 and any(pattern in text for pattern in NOISE_PATTERNS):
+            if len(text) < 100 and _NOISE_RE.search(text):
                 continue
 
             elements.append(StreamElement(
@@ -220,12 +283,17 @@ class PDFStreamLoader:
                 content=text,
                 page_num=page_num,
                 y_position=y_pos,
-                bbox=tuple(bbox)
+                bbox=(x0, y0, x1, y1)
             ))
 
         return elements
 
-    def _extract_images(self, page: fitz.Page, page_num: int) -> list[StreamElement]:
+    def _extract_images(
+        self,
+        page: fitz.Page,
+        page_num: int,
+        text_elements: Optional[list[StreamElement]] = None
+    ) -> list[StreamElement]:
         """
         提取页面上的实质性图片。
 
@@ -233,10 +301,17 @@ class PDFStreamLoader:
         1. 如果图片区域内有 PyMuPDF 文本 -> 丢弃 (文字已在 text stream)
         2. 如果无文本且位于页眉/页脚 -> 丢弃 (装饰图片)
         3. 否则 -> 保留 (实质性图片：截图/图表)
+
+        文本重叠检查复用本页已提取的文本块 bbox (一次扫描 + 矩形相交),
+        不再对每张图片调用 get_text(clip=...) 重走整个文本层。
         """
         elements = []
         page_height = page.rect.height
 
+        if text_elements is None:
+            text_elements = self._extract_text_blocks(page, page_num)
+        text_boxes = [(e.bbox, len(e.content)) for e in text_elements]
+
         # 页眉/页脚区域阈值
         HEADER_THRESHOLD = 80  # Y < 80 为页眉
         FOOTER_THRESHOLD = page_height - 80  # Y > page_height - 80 为页脚
@@ -256,13 +331,16 @@ class PDFStreamLoader:
                 rect = img_rects[0]  # 取第一个位置
 
                 # === 简化判定 ===
-                pdf_text = page.get_text("text", clip=rect).strip()
-
                 # 条件 A: 有文本层 -> 丢弃 (文字渲染层，已在 text stream)
                 # 修正: 许多图表包含少量文字标签，不能直接丢弃。
                 # 只有当图片区域包含"大量"文字(可能是正文背景图)时才丢弃。
-                if pdf_text and len(pdf_text) > 50:
-                    print(f"[DEBUG] Skip image at {rect} (Page {page_num}): Overlaps with significant text ({len(pdf_text)} chars)")
+                overlap_chars = 0
+                for (tx0, ty0, tx1, ty1), text_len in text_boxes:
+                    if tx0 < rect.x1 and tx1 > rect.x0 and ty0 < rect.y1 and ty1 > rect.y0:
+                        overlap_chars += text_len
+
+                if overlap_chars > 50:
+                    print(f"[DEBUG] Skip image at {rect} (Page {page_num}): Overlaps with significant text ({overlap_chars} chars)")
                     continue
 
                 # 条件 B: 无文本 + 页眉/页脚位置 -> 丢弃 (装饰图片)
@@ -289,6 +367,28 @@ class PDFStreamLoader:
     def close(self):
         if self.doc:
             self.doc.close()
+        if self._mm is not None:
+            self._mm.close()
+            os.close(self._fd)
+            self._mm = None
+
+
+@lru_cache(maxsize=None)
+def _worker_loader(pdf_path: str) -> PDFStreamLoader:
+    """每个 worker 进程只打开一次 Document, 随后的页面复用同一个句柄"""
+    loader = PDFStreamLoader(pdf_path)
+    loader.doc = fitz.open(stream=memoryview(loader._mm), filetype="pdf")
+    return loader
+
+
+def _extract_page_elements(pdf_path: str, page_idx: int):
+    """顶层 worker 函数 (可 pickle): 提取单页的文本块与图片块"""
+    loader = _worker_loader(pdf_path)
+    page = loader.doc[page_idx]
+    page_num = page_idx + 1  # 1-indexed
+    text_elements = loader._extract_text_blocks(page, page_num)
+    image_elements = loader._extract_images(page, page_num, text_elements)
+    return text_elements, image_elements
 
 
 class SectionSegmenter:
@@ -308,14 +408,24 @@ class SectionSegmenter:
 
     def _load_toc(self):
         """加载并扁平化 TOC"""
-        with open(self.toc_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        # mmap 让 orjson 直接在页缓存上解析, 省掉中间 bytes 拷贝;
+        # 小文件 (<4KB) 建立映射的开销占主导, 退回普通 read
+        with open(self.toc_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < 4096:
+                data = orjson.loads(f.read())
+            else:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    with memoryview(mm) as view:
+                        data = orjson.loads(view)
+                finally:
+                    mm.close()
 
         def flatten(entries, parent_id=""):
             for entry in entries:
                 title = entry["title"]
                 # 从标题中提取章节 ID (例如 "2.2.2 Compiling..." -> "2.2.2")
-                match = re.match(r"^([\d.]+)\s+", title)
+                match = _TITLE_ID_RE.match(title)
                 section_id = match.group(1) if match else title
 
                 toc_entry = TOCEntry(
@@ -332,6 +442,8 @@ class SectionSegmenter:
         flatten(data.get("toc_tree", []))
         # 按页码排序
         self.flat_toc.sort(key=lambda e: e.page)
+        # 合法章节 ID 集合: O(1) 哈希探测替代逐块线性扫描 TOC
+        self._valid_section_ids = frozenset(e.section_id for e in self.flat_toc)
 
     def segment(self, stream: list[StreamElement]) -> dict[str, list[StreamElement]]:
         """
@@ -351,38 +463,41 @@ class SectionSegmenter:
         title_to_section: dict[str, str] = {}
         for toc in self.flat_toc:
             # 使用标题的核心部分进行匹配 (去除数字前缀后的文字)
-            match = re.match(r"^[\d.]+\s+(.+)$", toc.title)
+            match = _TITLE_CORE_RE.match(toc.title)
             if match:
                 core_title = match.group(1).strip()
                 title_to_section[core_title] = toc.section_id
             # 同时保留完整标题用于精确匹配
             title_to_section[toc.title] = toc.section_id
 
-        # 结果容器
-        sections: dict[str, list[StreamElement]] = {}
+        # 结果容器 (defaultdict: 每个元素只做一次哈希查找)
+        sections: dict[str, list[StreamElement]] = defaultdict(list)
         current_section_id = "_preamble"  # 第一个章节之前的内容
 
+        # 枚举成员提升为局部变量, 省去逐元素的属性查找
+        text_type = ElementType.TEXT
+        header_type = ElementType.HEADER
+
         for element in stream:
             detected_section = None
 
             # 只对文本块进行标题检测
-            if element.element_type == ElementType.TEXT:
+            if element.element_type == text_type:
                 detected_section = self._detect_section_header(element.content, title_to_section)
 
             if detected_section:
                 # 切换章节
                 current_section_id = detected_section
-                element.element_type = ElementType.HEADER
+                element.element_type = header_type
                 element.section_id = current_section_id
             else:
                 element.section_id = current_section_id
 
             # 添加到当前章节
-            if current_section_id not in sections:
-                sections[current_section_id] = []
             sections[current_section_id].append(element)
 
-        return sections
+        # 下游按普通 dict 处理 (避免 membership 测试意外建键)
+        return dict(sections)
 
     def _detect_section_header(self, text: str, title_map: dict[str, str]) -> Optional[str]:
         """
@@ -401,17 +516,16 @@ class SectionSegmenter:
 
         # 过滤 TOC 条目 (结尾是点和数字)
         # e.g. "3.7 Log Generation Commands ........................ 30"
-        if re.search(r"\.\.+\s*\d+$", text):
+        if _TOC_DOT_RE.search(text):
             return None
 
         # 唯一策略: 必须以 "X.X.X 标题" 格式开头
-        match = re.match(r"^(\d+(?:\.\d+)*)\s+\S", text)
+        match = _SECTION_RE.match(text)
         if match:
             potential_id = match.group(1)
             # 检查这个 ID 是否在 TOC 中
-            for toc in self.flat_toc:
-                if toc.section_id == potential_id:
-                    return potential_id
+            if potential_id in self._valid_section_ids:
+                return potential_id
 
         return None
 
@@ -4,7 +4,8 @@ Runs the IngestionPipeline on a target file and validates the output integrity.
 """
 
 import sys
-import json
+import mmap
+import orjson
 import os
 from pathlib import Path
 
@@ -19,8 +20,18 @@ def verify_output(json_path: str):
     """
     print(f"\n[Verification] Checking {json_path}...")
 
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    # mmap lets orjson parse straight off the page cache with no intermediate
+    # bytes copy; for tiny files the mapping setup dominates, so just read()
+    with open(json_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < 4096:
+            data = orjson.loads(f.read())
+        else:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                with memoryview(mm) as view:
+                    data = orjson.loads(view)
+            finally:
+                mm.close()
 
     # Check structure
     assert "section_id" in data
@@ -7,12 +7,19 @@ import sys
 import os
 import json
 import asyncio
+import hashlib
+import socket
+import struct
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Any
 
 # Setup paths
 sys.path.insert(0, str(Path(__file__).parent))
-# sys.path.insert(0, str(Path(__file__).parent.parent / "simplified_mem")) # REMOVED
 
 # Import RAG capability
 from database.vector_store import VectorStore
@@ -23,7 +30,156 @@ import config as global_config
 # MCP Constants
 MCP_PROTOCOL_VERSION = "2024-11-05"
 
+# orjson parses/serializes several times faster than stdlib json and emits
+# bytes directly (no encode step); fall back for zero-dep installs
+try:
+    import orjson
+
+    _loads = orjson.loads
+
+    def _dumps(data: dict) -> bytes:
+        return orjson.dumps(data)
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(data: dict) -> bytes:
+        return json.dumps(data).encode("utf-8")
+
+class QueryCache:
+    """
+    Thread-safe LRU + TTL cache for repeated search queries.
+
+    Agent clients tend to re-issue the same tool call while iterating; a hit
+    turns "embed + ANN scan" into a dict lookup. Values hold both the query
+    embedding and the formatted result list.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(query: str, top_k: int) -> str:
+        return hashlib.blake2b(
+            f"{query}|{top_k}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            ts, value = entry
+            if time.monotonic() - ts >= self.ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def print_stats(self):
+        print(
+            f"[QueryCache] hits={self.hits} misses={self.misses} evictions={self.evictions}",
+            file=sys.stderr
+        )
+
+
+class RemoteEmbedder:
+    """
+    Thin client for the warm embedding daemon (src/embed_daemon.py).
+
+    Connects lazily over a Unix domain socket and exchanges length-prefixed
+    frames, so restarting the MCP server costs milliseconds instead of a full
+    torch model load. Any connection failure falls back to loading
+    EmbeddingModel in-process, which also covers platforms without AF_UNIX.
+    """
+
+    def __init__(self, socket_path: str = None):
+        self.socket_path = socket_path or os.environ.get(
+            "EMBED_DAEMON_SOCKET", "/tmp/simplemem_embed.sock"
+        )
+        self._sock = None
+        self._local = None
+        self._dim = None
+
+    def _connect(self) -> socket.socket:
+        if self._sock is None:
+            # Windows has no socket.AF_UNIX (AttributeError, not OSError);
+            # surface it as OSError so the in-process fallback engages
+            if not hasattr(socket, "AF_UNIX"):
+                raise OSError("AF_UNIX sockets not supported on this platform")
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.socket_path)
+            self._sock = sock
+        return self._sock
+
+    @staticmethod
+    def _recv_exact(sock: socket.socket, size: int) -> bytes:
+        chunks = []
+        while size:
+            chunk = sock.recv(size)
+            if not chunk:
+                raise ConnectionError("daemon closed mid-frame")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def _request(self, queries: List[str], is_query: bool) -> np.ndarray:
+        sock = self._connect()
+        payload = _dumps({"queries": queries, "is_query": is_query})
+        sock.sendall(struct.pack("<I", len(payload)) + payload)
+
+        rows, dim = struct.unpack("<II", self._recv_exact(sock, 8))
+        self._dim = dim
+        buf = self._recv_exact(sock, rows * dim * 4)
+        return np.frombuffer(buf, dtype=np.float32).reshape(rows, dim)
+
+    def _fallback(self) -> EmbeddingModel:
+        if self._local is None:
+            print("[WARN] Embed daemon unreachable, loading model in-process", file=sys.stderr)
+            self._local = EmbeddingModel()
+        return self._local
+
+    @property
+    def dimension(self) -> int:
+        if self._local is not None:
+            return self._local.dimension
+        if self._dim is None:
+            try:
+                self._request([], is_query=True)  # dimension handshake
+            except OSError:
+                self._sock = None
+                return self._fallback().dimension
+        return self._dim
+
+    def encode_query(self, queries: List[str]) -> np.ndarray:
+        try:
+            return self._request(list(queries), is_query=True)
+        except OSError:
+            self._sock = None
+            return self._fallback().encode_query(queries)
+
+
 class SimpleMemMCPServer:
+    # Only the columns _format_match reads; projecting here keeps LanceDB
+    # from fetching the vector and image-blob columns for every hit
+    _SEARCH_COLUMNS = ["lossless_restatement", "location", "topic", "section"]
+
     def __init__(self):
         self.db = lancedb.connect(global_config.LANCEDB_PATH)
         self.table_name = "multimodal_memory"
@@ -33,27 +189,133 @@ class SimpleMemMCPServer:
             self.table = None
             print(f"[WARN] Table {self.table_name} not found in {global_config.LANCEDB_PATH}", file=sys.stderr)
 
-        self.embedder = EmbeddingModel()
+        # Prefer the warm daemon; falls back to an in-process model
+        self.embedder = RemoteEmbedder()
+        self.query_cache = QueryCache(max_size=512, ttl=300.0)
+
+        # Pending responses accumulate here and go out in one write+flush
+        # per burst (see run), coalescing syscalls under pipelined clients
+        self._out_buf = bytearray()
+
+        # Search-time accuracy/latency knobs (fast -> recall-max profiles).
+        # Candidate generation runs on the index's compressed PQ codes
+        # (~1 byte per sub-vector, tighter than an int8 copy of the raw
+        # vectors would be); refine_factor then re-ranks the top
+        # top_k * factor candidates with full-precision vectors, so the
+        # bulk scan never touches floats. Set the env var to 0 to disable
+        # the re-rank stage.
+        self.nprobes = int(os.environ.get("MCP_SEARCH_NPROBES", "20"))
+        self.refine_factor = int(os.environ.get("MCP_SEARCH_REFINE_FACTOR", "30"))
+
+        if self.table is not None:
+            self._ensure_index()
+
+    def _ensure_index(self):
+        """
+        Idempotently build an IVF-PQ index on the vector column so searches
+        stay sublinear instead of brute-force scanning every row. Repeated
+        starts are no-ops: an existing index short-circuits, and any Lance
+        error just leaves flat search in place.
+        """
+        try:
+            for idx in self.table.list_indices():
+                if "vector" in getattr(idx, "columns", ()):
+                    return
+
+            n = self.table.count_rows()
+            if n == 0:
+                return
+
+            # Stored vectors are normalized at encode time, so inner product
+            # equals cosine — and dot skips the per-search normalization pass
+            self.table.create_index(
+                metric="dot",
+                num_partitions=max(1, int(n ** 0.5)),
+                num_sub_vectors=max(8, self.embedder.dimension // 16),
+                vector_column_name="vector"
+            )
+            print(f"[INFO] Created IVF-PQ index over {n} rows", file=sys.stderr)
+        except Exception as e:
+            print(f"[WARN] Vector index setup skipped: {e}", file=sys.stderr)
+
+    def _apply_search_params(self, search_query):
+        """Attach nprobes/refine_factor tunables to a LanceDB query builder."""
+        search_query = search_query.nprobes(self.nprobes)
+        if self.refine_factor > 0:
+            search_query = search_query.refine_factor(self.refine_factor)
+        return search_query
 
     def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Perform multimodal search"""
+        """Perform multimodal search; returns ready-to-send MCP content blocks"""
         if not self.table:
-            return [{"error": "Database not initialized"}]
-
-        query_vector = self.embedder.encode_query([query])[0]
-        results = self.table.search(query_vector.tolist()).limit(top_k).to_list()
-
-        matches = []
-        for res in results:
-            matches.append({
-                "content": res["lossless_restatement"],
-                "image_path": res["location"],
-                "source": res["topic"],
-                "section": res["section"],
-                "score": 1.0 - res.get('_distance', 0.5) # Rough score approx
-            })
+            return [{"type": "text", "text": "Error: Database not initialized"}]
+
+        cache_key = QueryCache.make_key(query, top_k)
+        cached = self.query_cache.get(cache_key)
+        if cached is not None:
+            return cached[1]
+
+        query_vector = self._normalize(self.embedder.encode_query([query]))[0]
+        search_query = self._apply_search_params(self.table.search(query_vector))
+        results = (
+            search_query.select(self._SEARCH_COLUMNS)
+            .limit(top_k)
+            .to_arrow()
+            .to_pylist()
+        )
+        matches = [self._format_match(res) for res in results]
+
+        self.query_cache.put(cache_key, (query_vector, matches))
         return matches
 
+    def search_batch(self, queries: List[str], top_k: int = 3) -> List[List[Dict[str, Any]]]:
+        """
+        Batch variant of search: one embedding forward pass for all queries
+        (amortizing tokenizer + model overhead), then the ANN lookups run
+        concurrently on a small thread pool. Results stay positional.
+        """
+        if not self.table:
+            return [[{"type": "text", "text": "Error: Database not initialized"}] for _ in queries]
+
+        query_vectors = self._normalize(self.embedder.encode_query(queries))
+
+        def run_search(vec):
+            search_query = self._apply_search_params(self.table.search(vec))
+            results = (
+                search_query.select(self._SEARCH_COLUMNS)
+                .limit(top_k)
+                .to_arrow()
+                .to_pylist()
+            )
+            return [self._format_match(res) for res in results]
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            return list(pool.map(run_search, query_vectors))
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        """
+        Unit-normalize query vectors once in float32 so the dot-metric index
+        needs no per-search normalization, and pass numpy straight to
+        LanceDB instead of a Python list (skips list -> Arrow conversion).
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0.0, 1.0, norms)
+
+    @staticmethod
+    def _format_match(res: Dict[str, Any]) -> Dict[str, Any]:
+        # Emit the final MCP content block in one pass; the tools/call
+        # handler no longer re-walks an intermediate match dict
+        return {
+            "type": "text",
+            "text": (
+                f"Source: {res['topic']} (Section {res['section']})\n"
+                f"Content: {res['lossless_restatement']}\n"
+                f"Image Ref: {res['location']}"
+            )
+        }
+
     async def run(self):
         """Standard IO Loop for MCP"""
         # Minimal MCP protocol implementation over Stdio
@@ -63,6 +325,17 @@ class SimpleMemMCPServer:
         loop = asyncio.get_running_loop()
         reader = asyncio.StreamReader()
 
+        # Count of complete lines fed but not yet consumed below. The
+        # feeding thread only hands over whole lines (readline blocks until
+        # the newline), so this tells a full pipelined request apart from a
+        # half-received one — which peeking at the reader's buffer cannot.
+        pending_lines = 0
+
+        def feed_line(data: bytes):
+            nonlocal pending_lines
+            pending_lines += 1
+            reader.feed_data(data)
+
         def reading_thread():
             """Reads stdin in a separate thread and feeds the async reader"""
             try:
@@ -71,14 +344,13 @@ class SimpleMemMCPServer:
                     line = sys.stdin.buffer.readline()
                     if not line:
                         break
-                    loop.call_soon_threadsafe(reader.feed_data, line)
+                    loop.call_soon_threadsafe(feed_line, line)
                 loop.call_soon_threadsafe(reader.feed_eof)
             except Exception as e:
                 print(f"[TCP Error] Reading thread failed: {e}", file=sys.stderr)
                 loop.call_soon_threadsafe(reader.feed_eof)
 
         # Start input thread
-        import threading
         t = threading.Thread(target=reading_thread, daemon=True)
         t.start()
 
@@ -87,12 +359,12 @@ class SimpleMemMCPServer:
         # For simplicity and robustness, we just write to sys.stdout.buffer
 
         async for line in reader:
+            pending_lines -= 1
             try:
-                 # line is bytes
-                msg_str = line.decode('utf-8').strip()
-                if not msg_str: continue
+                 # line is bytes; orjson parses it directly, no decode pass
+                if not line.strip(): continue
 
-                msg = json.loads(msg_str)
+                msg = _loads(line)
 
                 # Handle Initialize
                 if msg.get("method") == "initialize":
@@ -132,6 +404,21 @@ class SimpleMemMCPServer:
                                         },
                                         "required": ["query"]
                                     }
+                                },
+                                {
+                                    "name": "search_technical_manual_batch",
+                                    "description": "Search the technical manual with several queries at once. Embeds all queries in one model pass and returns one result group per query, in order.",
+                                    "inputSchema": {
+                                        "type": "object",
+                                        "properties": {
+                                            "queries": {
+                                                "type": "array",
+                                                "items": {"type": "string"},
+                                                "description": "The search queries"
+                                            }
+                                        },
+                                        "required": ["queries"]
+                                    }
                                 }
                             ]
                         }
@@ -147,14 +434,8 @@ class SimpleMemMCPServer:
 
                     if name == "search_technical_manual":
                         query = args.get("query")
-                        results = self.search(query)
-
-                        # Format as MCP content
-                        content = []
-                        for item in results:
-                            # Send text
-                            text_block = f"Source: {item['source']} (Section {item['section']})\nContent: {item['content']}\nImage Ref: {item['image_path']}"
-                            content.append({"type": "text", "text": text_block})
+                        # Already formatted as MCP content blocks
+                        content = self.search(query)
 
                         response = {
                             "jsonrpc": "2.0",
@@ -164,6 +445,28 @@ class SimpleMemMCPServer:
                             }
                         }
                         self._send_json(response)
+                    elif name == "search_technical_manual_batch":
+                        queries = args.get("queries") or []
+                        batch_results = self.search_batch(queries)
+
+                        # One content block per query so the client can
+                        # associate result groups positionally
+                        content = [
+                            {
+                                "type": "text",
+                                "text": f"Query: {query}\n"
+                                        + "\n---\n".join(item["text"] for item in items)
+                            }
+                            for query, items in zip(queries, batch_results)
+                        ]
+
+                        self._send_json({
+                            "jsonrpc": "2.0",
+                            "id": req_id,
+                            "result": {
+                                "content": content
+                            }
+                        })
                     else:
                         # Unknown tool
                          self._send_json({
@@ -180,15 +483,33 @@ class SimpleMemMCPServer:
                 # Log error to stderr (don't corrupt stdout JSON-RPC)
                 print(f"[MCP Error] {e}", file=sys.stderr)
 
+            # Flush only when no further complete request is already queued;
+            # a pipelined burst of calls then costs one write + one flush
+            if self._out_buf and pending_lines == 0:
+                self._flush_output()
+
+        self._flush_output()
+
     def _send_json(self, data: dict):
-        """Write JSON response to stdout safely"""
+        """Queue a JSON response; sent in one write per burst (see run)"""
+        try:
+            # Bytes into the shared buffer to avoid encoding issues
+            self._out_buf += _dumps(data)
+            self._out_buf += b"\n"
+        except Exception as e:
+            print(f"[MCP Write Error] {e}", file=sys.stderr)
+
+    def _flush_output(self):
+        """Write all queued responses with a single write + flush"""
+        if not self._out_buf:
+            return
         try:
-            json_str = json.dumps(data)
-            # Write bytes to stdout buffer to avoid encoding issues
-            sys.stdout.buffer.write(json_str.encode('utf-8') + b"\n")
+            sys.stdout.buffer.write(self._out_buf)
             sys.stdout.buffer.flush()
         except Exception as e:
             print(f"[MCP Write Error] {e}", file=sys.stderr)
+        finally:
+            self._out_buf.clear()
 
 if __name__ == "__main__":
     # Remove previous Windows-specific loop policy fix as we are now using threads
@@ -200,3 +521,5 @@ if __name__ == "__main__":
         asyncio.run(server.run())
     except KeyboardInterrupt:
         pass
+    finally:
+        server.query_cache.print_stats()
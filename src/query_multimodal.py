@@ -5,47 +5,56 @@ Performs semantic search on the multimodal memory.
 
 import sys
 import os
+from functools import lru_cache
 from pathlib import Path
 from typing import List
 
 # Setup paths
 sys.path.insert(0, str(Path(__file__).parent))
-# sys.path.insert(0, str(Path(__file__).parent.parent / "simplified_mem")) # REMOVED
 
 import lancedb
 from database.vector_store import VectorStore
 from utils.embedding import EmbeddingModel
 import config as global_config
 
-def query_multimodal(query: str, top_k: int = 3):
-    print(f"\n🔍 Query: '{query}'")
+# Warm session state: the embedder and table load once and are reused by
+# every query in the process (the REPL's "ask many questions" workflow)
+_session = {"embedder": None, "table": None}
 
-    # 1. Connect to DB
-    # Note: We need to access the specific table "multimodal_memory"
-    # The VectorStore class defaults to config.MEMORY_TABLE_NAME
-    # We'll instantiate it specifically for our table
-    db = lancedb.connect(global_config.LANCEDB_PATH)
-    table_name = "multimodal_memory"
 
-    if table_name not in db.table_names():
-        print(f"[ERROR] Table '{table_name}' not found. Did you run inject_multimodal.py?")
-        return
+def _ensure_session() -> bool:
+    """Connect to DB and load the embedder on first use; reuse afterwards."""
+    if _session["table"] is None:
+        # Note: We need to access the specific table "multimodal_memory"
+        # The VectorStore class defaults to config.MEMORY_TABLE_NAME
+        db = lancedb.connect(global_config.LANCEDB_PATH)
+        table_name = "multimodal_memory"
+
+        if table_name not in db.table_names():
+            print(f"[ERROR] Table '{table_name}' not found. Did you run inject_multimodal.py?")
+            return False
 
-    table = db.open_table(table_name)
+        _session["table"] = db.open_table(table_name)
+        _session["embedder"] = EmbeddingModel()
+    return True
 
-    # 2. Embed Query
-    embedder = EmbeddingModel()
-    query_vector = embedder.encode_query([query])[0]
 
-    # 3. Search
-    results = table.search(query_vector.tolist()).limit(top_k).to_list()
+@lru_cache(maxsize=256)
+def _cached_search(query: str, top_k: int) -> tuple:
+    """Embed + ANN search; repeated identical questions hit the cache."""
+    query_vector = _session["embedder"].encode_query([query])[0]
+    return tuple(_session["table"].search(query_vector.tolist()).limit(top_k).to_list())
+
+
+def query_multimodal_inner(query: str, top_k: int = 3):
+    """Search using the already-warm session and print the matches."""
+    print(f"\n🔍 Query: '{query}'")
 
-    # 4. Display Results
+    results = _cached_search(query, top_k)
     print(f"✅ Found {len(results)} matches:\n")
 
     for i, res in enumerate(results):
-        score = 1.0 # LanceDB doesn't easy give score in .to_list() unless requested, assuming close enough
-        # Actually _distance is usually available
+        # _distance is usually available
         dist = res.get('_distance', 0.0)
 
         print(f"--- [Match #{i+1}] (Dist: {dist:.4f}) ---")
@@ -55,11 +64,37 @@ def query_multimodal(query: str, top_k: int = 3):
         print(f"📝 Text Snippet: {res['lossless_restatement'][:150].replace(chr(10), ' ')}...")
         print("-" * 40)
 
+def query_multimodal(query: str, top_k: int = 3):
+    if not _ensure_session():
+        return
+    query_multimodal_inner(query, top_k)
+
+def repl(top_k: int = 3):
+    """Interactive loop: pay the model/DB load once, then query at will."""
+    if not _ensure_session():
+        return
+
+    print("Interactive mode — empty line or Ctrl-D exits.")
+    while True:
+        try:
+            q = input("> ").strip()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if not q:
+            break
+        query_multimodal_inner(q, top_k)
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument("query", help="Query string")
+    parser.add_argument("query", nargs="?", help="Query string")
     parser.add_argument("--k", type=int, default=3, help="Top K results")
+    parser.add_argument("--repl", action="store_true", help="Interactive mode (keeps model warm)")
     args = parser.parse_args()
 
-    query_multimodal(args.query, args.k)
+    if args.repl:
+        repl(args.k)
+    elif args.query:
+        query_multimodal(args.query, args.k)
+    else:
+        parser.error("provide a query or use --repl")
@@ -0,0 +1,49 @@
+"""
+Embedding cache - Shared LRU for query embeddings
+
+Both query_multimodal and the MCP server embed free-form query strings on
+every request, and agent clients repeat themselves constantly. This module
+holds one process-wide cache so every entry point reuses prior encodings;
+EmbeddingModel.encode_query consults it per item and only sends misses to
+the model.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+
+class EmbedCache:
+    """Thread-safe LRU mapping query text to its embedding vector."""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self._key(text)
+        with self._lock:
+            vec = self._entries.get(key)
+            if vec is None:
+                return None
+            self._entries.move_to_end(key)
+            return vec
+
+    def put(self, text: str, vec: np.ndarray):
+        key = self._key(text)
+        with self._lock:
+            self._entries[key] = vec
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+# Process-wide singleton shared by every entry point
+shared_cache = EmbedCache()
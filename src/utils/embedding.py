@@ -124,8 +124,26 @@ class EmbeddingModel:
     def encode_query(self, queries: List[str]) -> np.ndarray:
         """
         Encode queries with optimal settings for Qwen3
+
+        Checks the shared embedding cache per item, batches only the misses
+        through the model, and stitches results back in order — repeated
+        queries (the common agent pattern) cost a dict lookup.
         """
-        return self.encode(queries, is_query=True)
+        from utils.embed_cache import shared_cache
+
+        if isinstance(queries, str):
+            queries = [queries]
+
+        cached = [shared_cache.get(q) for q in queries]
+        miss_idx = [i for i, vec in enumerate(cached) if vec is None]
+
+        if miss_idx:
+            encoded = self.encode([queries[i] for i in miss_idx], is_query=True)
+            for i, vec in zip(miss_idx, encoded):
+                shared_cache.put(queries[i], vec)
+                cached[i] = vec
+
+        return np.asarray(cached)
     
     def encode_documents(self, documents: List[str]) -> np.ndarray:
         """
@@ -9,15 +9,20 @@ Vision Agent Module - 视觉语义翻译器
 - 输出可直接插入 Markdown 的文本块
 """
 
+import asyncio
 import base64
+import hashlib
+import io
 import os
 import sys
 from pathlib import Path
 
+from PIL import Image
+
 # 添加 simplified_mem 到路径以导入 config
 # sys.path.insert(0, str(Path(__file__).parent.parent / "simplified_mem")) # REMOVED
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
 try:
     from config import OPENAI_API_KEY, OPENAI_BASE_URL, LLM_MODEL
@@ -56,10 +61,31 @@ class ImageTranslator:
 
 你必须根据上下文判断这张图片要传达什么信息，然后用最恰当的格式输出。"""
 
-    def __init__(self, api_key: str = None, base_url: str = None, model: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        base_url: str = None,
+        model: str = None,
+        max_image_side: int = 1536,
+        jpeg_quality: int = 85,
+        cache_dir: str = None
+    ):
         self.api_key = api_key or OPENAI_API_KEY
         self.base_url = base_url or OPENAI_BASE_URL
         self.model = model or LLM_MODEL
+        # 上传前的预处理参数 (见 _downscale)
+        self.max_image_side = max_image_side
+        self.jpeg_quality = jpeg_quality
+
+        # 视觉翻译缓存: 手册里 logo/标准图会跨章节复用, 重跑摄取时整本重复;
+        # 以图片内容 + 上下文哈希为键, 命中直接返回之前的 Markdown。
+        # 默认锚定到项目根目录 (而非 CWD), 保证不同工作目录下命中同一份缓存;
+        # 目录在首次写入时才创建
+        if cache_dir is not None:
+            self._cache_dir = Path(cache_dir)
+        else:
+            self._cache_dir = Path(__file__).resolve().parent.parent / "multimodal_data" / "vision_cache"
+        self._mem_cache: dict = {}
 
         # 自动切换到 Vision 模型 (Moonshot 特有逻辑)
         print(f"[DEBUG] Init ImageTranslator with model: '{self.model}'")
@@ -72,6 +98,10 @@ class ImageTranslator:
         if self.base_url:
             client_kwargs["base_url"] = self.base_url
         self.client = OpenAI(**client_kwargs)
+        # 异步客户端 (供批量/并发摄取管线使用)
+        self.async_client = AsyncOpenAI(**client_kwargs)
+        # translate_batch_sync 的常驻事件循环 (首次调用时惰性创建)
+        self._loop = None
 
     def translate(
         self,
@@ -92,37 +122,170 @@ class ImageTranslator:
         Returns:
             可直接插入 Markdown 的文本
         """
+        # 命中缓存则完全跳过预处理和 API 调用
+        cache_key = self._cache_key(image_bytes, preceding_context, section_title)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
         # 构建上下文提示
         context_prompt = self._build_context_prompt(preceding_context, section_title)
 
-        # 将图片编码为 base64
-        image_b64 = base64.b64encode(image_bytes).decode("utf-8")
-        image_url = f"data:image/{image_format};base64,{image_b64}"
+        # 上传前降采样: 模型内部反正会缩图, 原尺寸只浪费带宽和输入 token
+        image_bytes, image_format = self._downscale(image_bytes, image_format)
+        image_url = self._build_image_url(image_bytes, image_format)
 
         # 调用 Vision API
         try:
             response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": self.SYSTEM_PROMPT},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": context_prompt},
-                            {"type": "image_url", "image_url": {"url": image_url}}
-                        ]
-                    }
-                ],
-                max_tokens=2000,
-                temperature=0.3
+                **self._request_kwargs(context_prompt, image_url)
             )
 
-            return response.choices[0].message.content.strip()
+            result = response.choices[0].message.content.strip()
+            self._cache_put(cache_key, result)
+            return result
 
         except Exception as e:
             print(f"[ERROR] Vision API 调用失败: {e}")
             return f"[图片描述生成失败: {e}]"
 
+    async def translate_async(
+        self,
+        image_bytes: bytes,
+        preceding_context: str,
+        section_title: str = "",
+        image_format: str = "png"
+    ) -> str:
+        """
+        translate 的异步版本: 缓存/预处理逻辑相同, API 调用不阻塞事件循环,
+        供 translate_batch 并发使用。
+        """
+        cache_key = self._cache_key(image_bytes, preceding_context, section_title)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        context_prompt = self._build_context_prompt(preceding_context, section_title)
+        image_bytes, image_format = self._downscale(image_bytes, image_format)
+        image_url = self._build_image_url(image_bytes, image_format)
+
+        try:
+            response = await self.async_client.chat.completions.create(
+                **self._request_kwargs(context_prompt, image_url)
+            )
+
+            result = response.choices[0].message.content.strip()
+            self._cache_put(cache_key, result)
+            return result
+
+        except Exception as e:
+            print(f"[ERROR] Vision API 调用失败: {e}")
+            return f"[图片描述生成失败: {e}]"
+
+    async def translate_batch(self, items: list, concurrency: int = 8) -> list:
+        """
+        并发翻译一批图片。
+
+        items: (image_bytes, preceding_context[, section_title[, image_format]])
+        元组列表; 信号量把在途请求限制在 API 速率允许的范围内,
+        吞吐随并发数线性提升。返回结果与输入顺序一一对应。
+        """
+        sem = asyncio.Semaphore(concurrency)
+
+        async def bounded(item):
+            async with sem:
+                return await self.translate_async(*item)
+
+        return await asyncio.gather(*(bounded(item) for item in items))
+
+    def translate_batch_sync(self, items: list, concurrency: int = 8) -> list:
+        """
+        同步入口 (供摄取脚本使用)。
+
+        复用一个常驻事件循环: async_client 的连接池绑定在首次运行的循环上,
+        若每次都走 asyncio.run, 第二批开始会因循环已关闭而全部失败。
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(self.translate_batch(items, concurrency))
+
+    @staticmethod
+    def _build_image_url(image_bytes: bytes, image_format: str) -> str:
+        # 在单个 bytearray 中拼装 data URL,
+        # 避免 bytes → b64 bytes → str → URL str 的多份 MB 级临时拷贝
+        buf = bytearray(b"data:image/")
+        buf += image_format.encode("ascii")
+        buf += b";base64,"
+        buf += base64.b64encode(image_bytes)
+        return buf.decode("ascii")
+
+    def _request_kwargs(self, context_prompt: str, image_url: str) -> dict:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": context_prompt},
+                        {"type": "image_url", "image_url": {"url": image_url}}
+                    ]
+                }
+            ],
+            "max_tokens": 2000,
+            "temperature": 0.3
+        }
+
+    def _cache_key(self, image_bytes: bytes, preceding_context: str, section_title: str) -> str:
+        img_hash = hashlib.sha256(image_bytes).hexdigest()
+        ctx_hash = hashlib.sha256(
+            f"{preceding_context}|{section_title}|{self.model}".encode("utf-8")
+        ).hexdigest()[:16]
+        return f"{img_hash}-{ctx_hash}.md"
+
+    def _cache_get(self, key: str):
+        cached = self._mem_cache.get(key)
+        if cached is not None:
+            return cached
+
+        cache_file = self._cache_dir / key
+        if cache_file.exists():
+            text = cache_file.read_text(encoding="utf-8")
+            self._mem_cache[key] = text
+            return text
+        return None
+
+    def _cache_put(self, key: str, text: str):
+        self._mem_cache[key] = text
+        try:
+            self._cache_dir.mkdir(parents=True, exist_ok=True)
+            # 临时文件 + os.replace: 并发写下也不会读到半截缓存
+            tmp = self._cache_dir / f".{key}.{os.getpid()}.tmp"
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, self._cache_dir / key)
+        except OSError as e:
+            print(f"[WARN] 写入视觉缓存失败: {e}")
+
+    def _downscale(self, image_bytes: bytes, image_format: str) -> tuple:
+        """
+        把长边压到 max_image_side 并转 JPEG 后再上传。
+
+        2x 渲染的整页 PNG 可达 3000x4000; Vision 模型按 tile 计费且内部
+        会降采样, 预先缩图可把上传体积缩小 5-10 倍。失败时按原图上传。
+        """
+        try:
+            im = Image.open(io.BytesIO(image_bytes))
+            if max(im.size) <= self.max_image_side and image_format in ("jpeg", "jpg"):
+                return image_bytes, image_format
+
+            im.thumbnail((self.max_image_side, self.max_image_side), Image.LANCZOS)
+            buf = io.BytesIO()
+            im.convert("RGB").save(buf, format="JPEG", quality=self.jpeg_quality, optimize=False)
+            return buf.getvalue(), "jpeg"
+        except Exception as e:
+            print(f"[WARN] 图片预处理失败, 按原图上传: {e}")
+            return image_bytes, image_format
+
     def _build_context_prompt(self, preceding_context: str, section_title: str) -> str:
         """构建上下文提示"""
         # 限制上下文长度